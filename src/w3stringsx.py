@@ -1,13 +1,22 @@
 from __future__ import annotations
 import argparse
+import copy
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+import filecmp
+import functools
 import io
+import itertools
+import mmap
+import operator
 import os
 import re
 import shutil
 import subprocess
 import sys
-from typing import Any, Literal, cast
+import tempfile
+from typing import Any, Iterable, Iterator, Mapping, cast
 from xml.etree import ElementTree
 
 
@@ -37,6 +46,9 @@ ALL_LANGS_META: dict[str, str] = {
     'tr':   'cleartext',
     'zh':   'zh',
 }
+# sets for fast membership checks
+ALL_LANGS_SET: frozenset[str] = frozenset(ALL_LANGS)
+ALL_LANGS_META_VALUES: frozenset[str] = frozenset(ALL_LANGS_META.values())
 
 MOD_ID_RANGE: range = range(2110000000, 2120000000)
 
@@ -49,10 +61,33 @@ BUNDLED_XML_LOCALIZATION_ATTRIBS: dict[str, list[str]] = {
     'recipe': ['localisation_key_name']
 }
 
+# contents of a double-quoted string literal, which can't span multiple lines
+WS_STRING_LITERAL_REGEX: re.Pattern[str] = re.compile(r'"([^"\\\r\n]*(?:\\.[^"\\\r\n]*)*)"')
+WS_STRING_LITERAL_BYTES_REGEX: re.Pattern[bytes] = re.compile(WS_STRING_LITERAL_REGEX.pattern.encode())
+# UTF-8 scripts at least this big are memory-mapped instead of read
+WS_MMAP_MIN_FILE_SIZE = 4096
+
+# attributes recognized in the CSV header, matched against the line with all spaces removed;
+# a line with more than one '=' is a regular comment, so values can't contain it
+CSV_HEADER_LANG_META_REGEX: re.Pattern[str] = re.compile(r';meta\[language=([^=]*?)\]?$')
+CSV_HEADER_ID_SPACE_REGEX: re.Pattern[str] = re.compile(r';idspace=([^=]*)$')
+
+# how much of an XML file is read to find its root tag without running the XML parser
+XML_ROOT_SNIFF_SIZE = 1024
+XML_COMMENT_REGEX: re.Pattern[str] = re.compile(r'<!--.*?-->', re.DOTALL)
+# name of an opening tag, needs a delimiter after it so a name cut off at the end of the sniffed prefix doesn't match
+XML_TAG_REGEX: re.Pattern[str] = re.compile(r'<([A-Za-z_][\w.:-]*)[\s/>]')
+
+# CSV files are read and written line by line, a bigger buffer means much fewer system calls for large files
+CSV_IO_BUFFER_SIZE = 1 << 20
+
 COMMENT_SECTION_MENU = "menu"
 COMMENT_SECTION_BUNDLE = "bundle"
 COMMENT_SECTION_SCRIPTS = "scripts"
 
+# directories with fewer files than this are scanned in a single process, as spawning workers would cost more than it saves
+PARALLEL_SCAN_MIN_FILES = 32
+
 COLOR_NONE = '\033[0m'
 COLOR_WARN = '\033[93m'
 COLOR_ERROR = '\033[91m'
@@ -72,17 +107,21 @@ class InputPathType(Enum):
             return InputPathType.DIRECTORY
         else:
             _, ext = os.path.splitext(path)
-            match ext:
-                case '.w3strings':
-                    return InputPathType.W3STRINGS_FILE
-                case '.csv':
-                    return InputPathType.CSV_FILE
-                case '.xml':
-                    return InputPathType.XML_FILE
-                case '.ws' | '.wss':
-                    return InputPathType.WITCHERSCRIPT_FILE
-                case _:
-                    return InputPathType.UNSUPPORTED
+            return InputPathType.from_file_extension(ext)
+
+    # Classifies a path already known to be a file, doesn't touch the file system
+    @classmethod
+    def from_file_extension(cls, ext: str) -> InputPathType:
+        return FILE_EXTENSION_INPUT_PATH_TYPES.get(ext, InputPathType.UNSUPPORTED)
+
+
+FILE_EXTENSION_INPUT_PATH_TYPES: dict[str, InputPathType] = {
+    '.w3strings': InputPathType.W3STRINGS_FILE,
+    '.csv': InputPathType.CSV_FILE,
+    '.xml': InputPathType.XML_FILE,
+    '.ws': InputPathType.WITCHERSCRIPT_FILE,
+    '.wss': InputPathType.WITCHERSCRIPT_FILE
+}
 
 
 
@@ -108,32 +147,41 @@ def log_error(s: str):
 # Because encoder ALWAYS puts output in the same directory as input before we are able to move it 
 # we first need to create a temporary folder in which we'll execute the commands
 # This way no files will be overwritten without user's consent
+# Use it in a with statement, the folder is removed when leaving it
 class ScratchFolder:
     input_copy_path: str # basename should be exactly the same as original input basename 
     folder_path: str
+    temp_dir: tempfile.TemporaryDirectory[str]
 
     # Returns path to input that was copied to scratch 
     def __init__(self, input_file: str):
         input_folder, input_basename = os.path.split(input_file)
-        self.folder_path = os.path.join(input_folder, '.tmp.w3stringsx')
-        if not os.path.exists(self.folder_path):
-            log_info(f'Creating scratch folder {self.folder_path}')
-            os.mkdir(self.folder_path)
+        # the folder is created next to the input so the input can be linked into it
+        # and gets a unique name, so it never collides with user's files or another run
+        self.temp_dir = tempfile.TemporaryDirectory(prefix='.tmp.w3stringsx.', dir=os.path.abspath(input_folder))
+        self.folder_path = self.temp_dir.name
+        log_info(f'Creating scratch folder {self.folder_path}')
 
+        # the copy is only ever read, so it can share data with the original
         input_copy = os.path.join(self.folder_path, input_basename)
-        shutil.copy(input_file, input_copy)
+        link_or_copy(input_file, input_copy)
         
         self.input_copy_path = input_copy
 
-    def __del__(self):
+    def __enter__(self) -> ScratchFolder:
+        return self
+
+    def __exit__(self, *exc_info: Any):
         log_info(f'Removing scratch folder {self.folder_path}')
-        shutil.rmtree(self.folder_path)
+        self.temp_dir.cleanup()
 
 
 def lf_to_crlf(file_path: str):
-    with io.open(file_path, mode="r+") as f:
+    # binary mode, so the result doesn't depend on platform newline translation or locale encoding
+    with io.open(file_path, mode="rb+") as f:
         data = f.read()
-        data.replace('\n', '\r\n')
+        # existing CRLFs are normalized first so they don't turn into CRCRLF
+        data = data.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
         f.seek(0)
         f.write(data)
         f.truncate()
@@ -144,6 +192,44 @@ def maybeisfile(path:str) -> bool:
     return os.path.splitext(path)[1] != ''
 
 
+# Hard links src to dst so the same data doesn't need to be written again, copies it when linking isn't possible
+# (e.g. different drives or a file system without hard links)
+def link_or_copy(src: str, dst: str):
+    if os.path.lexists(dst):
+        # e.g. outputs from a previous run with unchanged input, files of different size are told apart without reading them
+        if filecmp.cmp(src, dst, shallow=False):
+            return
+        # an existing dst could be a link sharing data with other files, so it has to be replaced, not written into
+        os.remove(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+# Yields files in the directory tree in the same order os.walk would visit them,
+# but relies on file type information cached by os.scandir instead of stat-ing every entry
+def walk_dir_files(dir_path: str) -> Iterator[os.DirEntry[str]]:
+    dir_stack = [dir_path]
+    while len(dir_stack) > 0:
+        subdirs = list[str]()
+        try:
+            with os.scandir(dir_stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        # like os.walk, don't descend into symlinked directories
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    else:
+                        yield entry
+        except OSError:
+            # like os.walk, skip directories that can't be read
+            pass
+
+        dir_stack.extend(reversed(subdirs))
+
+
 def guess_file_encoding(path: str) -> str:
     with io.open(path, mode="rb") as f:
         header = f.read(3)
@@ -178,61 +264,60 @@ def resolve_output_path(input_path: str, output_path: str, pattern_for_dir: str
 
 
 # also preserve the order of first appearance
-def remove_duplicate_keys_and_filter(keys: list[str], search: str) -> list[str]:
-    key_set = set[str]()  # using set for fast lookup
-    result = list[str]()
-
-    for k in keys:
-        if k not in key_set:
-            key_set.add(k)
-            result.append(k)
-
-    result = list(filter(lambda k: k != "", result))
-    if search != "":
-        result = list(filter(lambda k: re.search(search, k) is not None, result))
+def remove_duplicate_keys_and_filter(keys: Iterable[str], search: re.Pattern[str] | None) -> list[str]:
+    # dict keeps insertion order, so it can serve as an ordered set
+    return filter_unique_keys(dict.fromkeys(keys), search)
 
-    return result
 
+# Same as above for keys that were already deduplicated into an ordered set, removes the empty key from it
+def filter_unique_keys(unique_keys: dict[str, None], search: re.Pattern[str] | None) -> list[str]:
+    unique_keys.pop("", None)
 
-# set operation, but done to preserve the order of lhs
-def key_list_difference(lhs: list[str], rhs: list[str]) -> list[str]:
-    rhs_set = set(rhs)
-    return [k for k in lhs if k not in rhs_set]
+    if search is not None:
+        return [k for k in unique_keys if search.search(k) is not None]
+    else:
+        return list(unique_keys)
 
 
 ###############################################################################################################################
 # ENCODER
 ###############################################################################################################################
 
+# Cached, so that repeated programmatic calls to main don't search for the encoder again
+@functools.lru_cache(maxsize=1)
+def find_w3strings_encoder() -> str | None:
+    # check script's folder
+    exe_path = os.path.join(os.path.dirname(__file__), 'w3strings.exe')
+    if os.path.exists(exe_path):
+        return exe_path
+
+    # check PATH, using the platform's separator
+    return shutil.which('w3strings.exe') or shutil.which('w3strings')
+
+
 class W3StringsEncoder:
     exe_path: str
 
     def __init__(self):
-        # check script's folder
-        self.exe_path = os.path.join(os.path.dirname(__file__), 'w3strings.exe')
-        
-        if not os.path.exists(self.exe_path):
-            # check PATH
-            for path in os.environ["PATH"].split(';'):
-                encoder_path = os.path.join(path, 'w3strings.exe')
-                if os.path.exists(encoder_path):
-                    self.exe_path = encoder_path
-                    break
-
-        if os.path.exists(self.exe_path):
-            log_info(f'Found w3strings encoder: {self.exe_path}')
-        else:
+        exe_path = find_w3strings_encoder()
+        if exe_path is None or not os.path.exists(exe_path):
+            # don't remember the failure, the encoder may be provided before the next attempt
+            find_w3strings_encoder.cache_clear()
             raise Exception('w3strings encoder couldn\'t be found')
 
+        self.exe_path = exe_path
+        log_info(f'Found w3strings encoder: {self.exe_path}')
+
 
-    def execute(self, cmd: str):
-        cmd = f'"{self.exe_path}" {cmd}'
+    # args are passed to the encoder as they are, without going through a shell, so paths don't need any quoting
+    def execute(self, args: list[str]):
+        cmd = [self.exe_path, *args]
 
         log_warning('Executing command:')
-        log_warning(cmd)
+        log_warning(subprocess.list2cmdline(cmd))
 
         # we ignore stderr, because it contains only the thread panic message without any information that is helpful to us
-        output = subprocess.run(cmd, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        output = subprocess.run(cmd, text=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         if logging_level > 0:
             print('=' * 100)
             lines = output.stdout.split('\n')
@@ -246,28 +331,31 @@ class W3StringsEncoder:
     # Returns the path to decoded file
     def decode(self, w3strings_path: str) -> str:
         log_info(f'Decoding {w3strings_path}...')
-        self.execute(f'-d "{w3strings_path}"')
+        self.execute(['-d', w3strings_path])
         return w3strings_path + '.csv' 
 
     # Returns the path to encoded file
     def encode(self, csv_path: str, id_space: int | None) -> str:
-        cmd = f'-e "{csv_path}" '
+        args = ['-e', csv_path]
         if id_space is None:
             DISABLE_ID_CHECK_FLAG = '--force-ignore-id-space-check-i-know-what-i-am-doing'
             log_warning(f'Disabling ID check in the encoder because of the existence of entries outside of a single mod ID range')
-            cmd += DISABLE_ID_CHECK_FLAG
+            args.append(DISABLE_ID_CHECK_FLAG)
         else:
-            cmd += f'-i {id_space}'
+            args.extend(['-i', str(id_space)])
 
         log_info(f'Encoding {csv_path}...')
-        self.execute(cmd)
+        self.execute(args)
 
         w3strings_path = csv_path + '.w3strings'
         ws_path = w3strings_path + '.ws'
 
-        if os.path.exists(ws_path):
-            log_info(f'Removing {ws_path}')
+        # the encoder doesn't always leave this file behind, removing it straight away spares an extra stat
+        try:
             os.remove(ws_path)
+            log_info(f'Removed {ws_path}')
+        except FileNotFoundError:
+            pass
 
         return w3strings_path
     
@@ -288,7 +376,9 @@ class W3StringsEncoder:
 # CSV FILE PARSING
 ###############################################################################################################################
 
+# entry classes use __slots__, because there is one instance per line of a CSV file
 class CsvAbbreviatedEntry:
+    __slots__ = ('key_str', 'text')
     key_str: str
     text: str
 
@@ -308,9 +398,8 @@ class CsvAbbreviatedEntry:
         )
 
 
-IdSpace = int | Literal["vanilla"]
-
 class CsvCompleteEntry:
+    __slots__ = ('id', 'key_hex', 'key_str', 'text')
     id: int
     key_hex: str
     key_str: str
@@ -323,19 +412,7 @@ class CsvCompleteEntry:
         self.text = text
 
     def __str__(self) -> str:
-        return '|'.join([
-            str(self.id).rjust(10, ' '),
-            self.key_hex.rjust(8, ' '),
-            self.key_str,
-            self.text
-        ])
-    
-        
-    def id_space(self) -> IdSpace:
-        if self.id not in MOD_ID_RANGE:
-            return "vanilla"
-        else:
-            return (self.id % 2110000000) // 1000
+        return f'{self.id:>10}|{self.key_hex:>8}|{self.key_str}|{self.text}'
 
 
 class CsvCommentAttribute:
@@ -350,22 +427,31 @@ class CsvCommentAttribute:
         return f";{self.key}={self.value}"
 
 
-def parse_entry(s: str) -> CsvAbbreviatedEntry | CsvCompleteEntry | CsvCommentAttribute | str:
-    s = s.strip()
+# Comments and section markers repeat verbatim across files, so their parsed form is cached.
+# Returned objects are shared between callers and must not be modified.
+@functools.lru_cache(maxsize=4096)
+def parse_comment_entry(s: str) -> CsvCommentAttribute | str:
     if len(s) == 0:
         return str(s)
-    elif s.startswith(';'):
-        attrib = s[1:].split('=')
-        # attribute should adhere to strict format
-        # ;key=value
-        # where key does not contain any spaces (like an identifier) and the entire lines has exactly one '=' character
-        # because otherwise it's treated as regular informational comment
-        if len(attrib) == 2 and attrib[0].count(' ') == 0:
-            return CsvCommentAttribute(attrib[0], attrib[1])
-        else:
-            return str(s)
 
-    split = s.strip().split('|')
+    attrib = s[1:].split('=')
+    # attribute should adhere to strict format
+    # ;key=value
+    # where key does not contain any spaces (like an identifier) and the entire lines has exactly one '=' character
+    # because otherwise it's treated as regular informational comment
+    if len(attrib) == 2 and attrib[0].count(' ') == 0:
+        return CsvCommentAttribute(attrib[0], attrib[1])
+    else:
+        return str(s)
+
+
+def parse_entry(s: str) -> CsvAbbreviatedEntry | CsvCompleteEntry | CsvCommentAttribute | str:
+    s = s.strip()
+    if len(s) == 0 or s.startswith(';'):
+        return parse_comment_entry(s)
+
+    # one split more than a complete entry needs is enough to tell that there are too many columns
+    split = s.split('|', 4)
     if len(split) == 2:
         return CsvAbbreviatedEntry(
             split[0], 
@@ -385,7 +471,7 @@ def parse_entry(s: str) -> CsvAbbreviatedEntry | CsvCompleteEntry | CsvCommentAt
             split[3]
         )
     else:
-        raise Exception(f'Invalid column count. Expected 2 or 4, got {len(split)}')
+        raise Exception(f'Invalid column count. Expected 2 or 4, got {s.count("|") + 1}')
 
 
 '''Input form of the document that can have features such as skipped header or abbreviated entries that will be converted into output document'''
@@ -401,18 +487,23 @@ class CsvInputDocument:
     def __init__(self, file_path: str):
         encoding = guess_file_encoding(file_path)
         log_info(f'Reading {file_path}. Detected encoding: {encoding}')
-        with io.open(file_path, mode='r', encoding=encoding) as file:
+        with io.open(file_path, mode='r', encoding=encoding, buffering=CSV_IO_BUFFER_SIZE) as file:
             self.read_target_lang(file_path)
 
-            file_lines = file.readlines()
+            # the file is read in a single pass, header stops at the first non-comment line and content picks up from there
+            file_lines = enumerate(file)
 
+            first_content_line: tuple[int, str] | None
             try:
-                self.read_header(file_lines)
+                first_content_line = self.read_header(file_lines)
             except Exception as e:
                 raise Exception(f'Failed to read file header:\n{e}')
 
             try:
-                self.read_content(file_lines)
+                if first_content_line is not None:
+                    self.read_content(itertools.chain([first_content_line], file_lines))
+                else:
+                    self.read_content(file_lines)
             except Exception as e:
                 raise Exception(f'Failed to read file content:\n{e}')
   
@@ -424,95 +515,95 @@ class CsvInputDocument:
         basename_parts = basename.split('.')[:-1] # without the extension
 
         for part in basename_parts:
-            if part in ALL_LANGS:
+            if part in ALL_LANGS_SET:
                 self.target_lang = part
                 log_info(f'Detected target language in file name: {self.target_lang}')
                 break
 
 
-    def read_header(self, file_lines: list[str]):
+    # Returns the first line that is not a part of the header or None if the end of file has been reached
+    def read_header(self, file_lines: Iterator[tuple[int, str]]) -> tuple[int, str] | None:
         self.header_lang_meta = None
         if self.target_lang is not None:
             self.header_lang_meta = ALL_LANGS_META[self.target_lang]
             log_info(f'Detected language meta "{self.header_lang_meta}" based on target language')
 
         self.header_mod_id_space = None
-        for line in file_lines:
+        first_content_line: tuple[int, str] | None = None
+        for i, line in file_lines:
             if not line.startswith(';'):
+                first_content_line = (i, line)
                 break
+
             comment = line.strip().replace(' ', '')
-            attrib = parse_entry(comment)
-            if isinstance(attrib, CsvCommentAttribute):
-                match attrib.key:
-                    case "meta[language":
-                        lang_meta = attrib.value[:-1]
-                        if lang_meta in ALL_LANGS_META.values():
-                            self.header_lang_meta = lang_meta
-                        else:
-                            raise Exception(f'Invalid header language meta: {lang_meta}. Available values: {ALL_LANGS_META.values()}')
+            if (lang_meta_match := CSV_HEADER_LANG_META_REGEX.match(comment)) is not None:
+                lang_meta = lang_meta_match.group(1)
+                if lang_meta in ALL_LANGS_META_VALUES:
+                    self.header_lang_meta = lang_meta
+                else:
+                    raise Exception(f'Invalid header language meta: {lang_meta}. Available values: {sorted(ALL_LANGS_META_VALUES)}')
+        
+                log_info(f'Detected language meta "{self.header_lang_meta}" based on file header')
+            elif (id_space_match := CSV_HEADER_ID_SPACE_REGEX.match(comment)) is not None:
+                try:
+                    self.header_mod_id_space = int(id_space_match.group(1))
+                except ValueError:
+                    raise Exception('Failed to parse id space value into a number')
+                
+                if self.header_mod_id_space not in range(0, 10000):
+                    raise Exception('Id space value falls out of 0-9999 range')
                 
-                        log_info(f'Detected language meta "{self.header_lang_meta}" based on file header')
-                    case "idspace":
-                        try:
-                            self.header_mod_id_space = int(attrib.value)
-                        except ValueError:
-                            raise Exception('Failed to parse id space value into a number')
-                        
-                        if self.header_mod_id_space not in range(0, 10000):
-                            raise Exception('Id space value falls out of 0-9999 range')
-                        
-                        log_warning(f'Detected mod id space in the header: {self.header_mod_id_space}')
-                    case _:
-                        pass
+                log_warning(f'Detected mod id space in the header: {self.header_mod_id_space}')
 
         if self.target_lang is None and self.header_lang_meta not in (None, 'cleartext'):
             # if it's not cleartext, it's the same as the proper file name
             log_info(f'Detected target language based on language meta: {self.target_lang}')
             self.target_lang = self.header_lang_meta
 
+        return first_content_line
 
 
-    def read_content(self, file_lines: list[str]):
+    def read_content(self, file_lines: Iterable[tuple[int, str]]):
         self.entries_abbrev = []
         self.entries_complete = []
+        self.has_vanilla_entries = False
+        self.content_mod_id_space = None
 
-        for i, line in enumerate(file_lines):
+        for i, line in file_lines:
             if not line.startswith(';'):
                 try:
                     entry = parse_entry(line)
-                    if isinstance(entry, CsvAbbreviatedEntry):
-                        self.entries_abbrev.append(entry)
-                    elif isinstance(entry, CsvCompleteEntry):
-                        self.entries_complete.append(entry)
                 except Exception as e:
                     raise Exception(f'Failed to read line {i}:\n{e}')
 
+                if isinstance(entry, CsvAbbreviatedEntry):
+                    self.entries_abbrev.append(entry)
+                elif isinstance(entry, CsvCompleteEntry):
+                    self.entries_complete.append(entry)
+
+                    # id space is worked out while reading, so entries don't have to be visited again
+                    if entry.id not in MOD_ID_RANGE:
+                        self.has_vanilla_entries = True
+                    else:
+                        id_space = (entry.id - MOD_ID_RANGE.start) // 1000
+                        if self.content_mod_id_space is None:
+                            self.content_mod_id_space = id_space
+                        elif id_space != self.content_mod_id_space:
+                            raise Exception(f'There are entries for multiple mod id spaces: {{{self.content_mod_id_space}, {id_space}}}')
+
         if len(self.entries_abbrev) + len(self.entries_complete) == 0:
             raise Exception('File has no data to encode')
         
-        all_ids = [entry.id for entry in self.entries_complete]
-        duplicate_ids = [id for id in all_ids if all_ids.count(id) > 1]
-        if len(duplicate_ids) > 1:
+        id_counts = Counter(entry.id for entry in self.entries_complete)
+        duplicate_ids = [id for id, count in id_counts.items() if count > 1]
+        if len(duplicate_ids) > 0:
             raise Exception(f'There are multiple entries with the same id: {duplicate_ids}')
-        
-        self.read_content_id_space()
-        
-
-    def read_content_id_space(self):
-        id_spaces = set[IdSpace]([entry.id_space() for entry in self.entries_complete])
-        self.has_vanilla_entries = "vanilla" in id_spaces
 
         if self.has_vanilla_entries:
             log_warning('Detected vanilla strings')
 
-        mod_id_spaces = set([id_space for id_space in id_spaces if isinstance(id_space, int)])
-        if len(mod_id_spaces) == 0:
-            self.content_mod_id_space = None
-        elif len(mod_id_spaces) == 1:
-            self.content_mod_id_space = mod_id_spaces.pop()
+        if self.content_mod_id_space is not None:
             log_warning(f'Detected mod id space in entries: {self.content_mod_id_space}')
-        else:
-            raise Exception(f'There are entries for multiple mod id spaces: {mod_id_spaces}')
         
         if self.header_mod_id_space is not None and self.content_mod_id_space is not None:
             if self.header_mod_id_space != self.content_mod_id_space:
@@ -535,18 +626,19 @@ class CsvOutputDocument:
         self.entries = entries
 
     def __str__(self) -> str:
-        file_lines: list[str] = []
-
-        file_lines.append(f';meta[language={self.header_lang_meta}]')
-        file_lines.append(';       id|key(hex)|key(str)|text')
-        file_lines.extend([str(entry) for entry in self.entries])
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
 
-        return '\n'.join(file_lines)
+    # Entries are written one by one, each line is prefixed with a newline so the output doesn't end with one
+    def write(self, file: io.TextIOBase):
+        file.write(f';meta[language={self.header_lang_meta}]')
+        file.write('\n;       id|key(hex)|key(str)|text')
+        file.writelines(f'\n{entry}' for entry in self.entries)
 
     def save_to_file(self, file_path: str):
-        with io.open(file_path, mode='w', encoding='UTF-8') as file:
-            output_str = str(self)
-            file.write(output_str)
+        with io.open(file_path, mode='w', encoding='UTF-8', buffering=CSV_IO_BUFFER_SIZE) as file:
+            self.write(file)
 
 
 def prepare_output_csv(input: CsvInputDocument) -> CsvOutputDocument:
@@ -564,7 +656,7 @@ def prepare_output_csv(input: CsvInputDocument) -> CsvOutputDocument:
     output_entries = list[CsvCompleteEntry]()
 
     if id_space is not None and len(input.entries_abbrev) > 0:
-        id_set = set([entry.id for entry in input.entries_complete])
+        id_set = {entry.id for entry in input.entries_complete}
         id_counter = MOD_ID_RANGE.start + id_space * 1000
         for entry in input.entries_abbrev:
             while id_counter in id_set:
@@ -574,11 +666,11 @@ def prepare_output_csv(input: CsvInputDocument) -> CsvOutputDocument:
             output_entries.append(complete)
             # A chance for ID overflow is rather low, so we will ignore it
             id_counter += 1
-            
-    for entry in input.entries_complete:
-        output_entries.append(entry)
 
-    output_entries.sort(key=lambda entry: entry.id)
+    output_entries.extend(input.entries_complete)
+
+    # complete entries are usually already in order and generated ones always are, sort picks up on such runs
+    output_entries.sort(key=operator.attrgetter('id'))
 
     return CsvOutputDocument(
         target_lang,
@@ -588,16 +680,13 @@ def prepare_output_csv(input: CsvInputDocument) -> CsvOutputDocument:
     )
 
 
-def save_abbreviated_entries(entries: dict[str, list[CsvAbbreviatedEntry]], file_path: str):
-    file_lines: list[str] = []
-    file_lines.append(";idspace=????")
-
-    for section, section_entries in entries.items():
-        file_lines.append(f";section={section}")
-        file_lines.extend([str(entry) for entry in section_entries])
-
-    with io.open(file_path, mode="w", encoding="UTF-8") as f:
-        f.write('\n'.join(file_lines))
+# entries are streamed straight into the file, each line is prefixed with a newline so the file doesn't end with one
+def save_abbreviated_entries(entries: Mapping[str, Iterable[CsvAbbreviatedEntry]], file_path: str):
+    with io.open(file_path, mode="w", encoding="UTF-8", buffering=CSV_IO_BUFFER_SIZE) as f:
+        f.write(";idspace=????")
+        for section, section_entries in entries.items():
+            f.write(f"\n;section={section}")
+            f.writelines(f"\n{entry}" for entry in section_entries)
 
 
 
@@ -612,7 +701,7 @@ class CsvMergingDocument:
         self.sections: list[tuple[str, int]]  = [] # (section_name, line_idx)
         self.str_keys: set[str] = set()
 
-        with io.open(file_path, mode="r", encoding=self.file_encoding) as f:
+        with io.open(file_path, mode="r", encoding=self.file_encoding, buffering=CSV_IO_BUFFER_SIZE) as f:
             for i, line in enumerate(f):
                 try:
                     entry = parse_entry(line)
@@ -630,17 +719,20 @@ class CsvMergingDocument:
 
     def save(self):
         log_info(f"Merging entries into an existing file...")
-        with io.open(self.file_path, mode="w", encoding=self.file_encoding) as f:
-            str_lines = [str(line) for line in self.file_lines]
-            f.write('\n'.join(str_lines))
+        with io.open(self.file_path, mode="w", encoding=self.file_encoding, buffering=CSV_IO_BUFFER_SIZE) as f:
+            lines = iter(self.file_lines)
+            first_line = next(lines, None)
+            if first_line is not None:
+                f.write(str(first_line))
+                f.writelines(f"\n{line}" for line in lines)
 
 
-    def insert_entries(self, entries: list[CsvAbbreviatedEntry], target_section: str):
+    def insert_entries(self, entries: Iterable[CsvAbbreviatedEntry], target_section: str):
         # filter out entries that already exist in the document
-        entries = list(filter(lambda e: e.key_str not in self.str_keys, entries))
+        new_entries = [e for e in entries if e.key_str not in self.str_keys]
 
         idx = self.section_range(target_section).stop
-        self.file_lines[idx:idx] = entries
+        self.file_lines[idx:idx] = new_entries
 
     def section_range(self, target_section: str) -> range:
         start_idx: int | None = None
@@ -674,16 +766,17 @@ class CsvMergingDocument:
 
 
 
-def merge_abbreviated_entries(entries: dict[str, list[CsvAbbreviatedEntry]], file_path: str):
+def merge_abbreviated_entries(entries: Mapping[str, Iterable[CsvAbbreviatedEntry]], file_path: str):
     doc = CsvMergingDocument(file_path)
     for section, section_entries in entries.items():
+        section_entries = list(section_entries)
         if len(section_entries) > 0:
             doc.insert_entries(section_entries, section)
 
     doc.save()
 
 
-def save_or_merge_abbreviated_entries(entries: dict[str, list[CsvAbbreviatedEntry]], file_path: str):
+def save_or_merge_abbreviated_entries(entries: Mapping[str, Iterable[CsvAbbreviatedEntry]], file_path: str):
     if os.path.exists(file_path):
         merge_abbreviated_entries(entries, file_path)
     else:
@@ -697,9 +790,12 @@ def save_or_merge_abbreviated_entries(entries: dict[str, list[CsvAbbreviatedEntr
 
 # A new class, because native ElementTree.Element doesn't have support for easy node parent access
 class ConfigXmlElement:
-    element: ElementTree.Element
+    # one instance per element in the document
+    __slots__ = ('tag', 'option_id', 'parent', 'children', 'display_name', 'custom_display_name', 'custom_names', 'non_localized', 'non_localized_except_first')
+    tag: str
+    option_id: str | None # "id" attribute of an Option element
 
-    parent: Any = None # can't use the same class type for it
+    parent: Any # can't use the same class type for it
     children: list[ConfigXmlElement]
 
     display_name: str
@@ -709,9 +805,10 @@ class ConfigXmlElement:
     non_localized_except_first: bool
 
 
-    # instantiate using base class object
+    # instantiate using base class object, children are added by from_file as the document is read
     def __init__(self, element: ElementTree.Element, parent: Any = None):
-        self.element = element
+        self.tag = element.tag
+        self.option_id = element.attrib.get("id")
         self.parent = parent
         self.children = []
         self.display_name = ''
@@ -734,15 +831,35 @@ class ConfigXmlElement:
         except KeyError:
             pass
 
-        for child in element:
-            self.children.append(ConfigXmlElement(child, self))
+    # Builds the tree while the file is being parsed, elements from the parser are discarded as soon as they're closed
+    @classmethod
+    def from_file(cls, file: io.TextIOBase) -> ConfigXmlElement:
+        root: ConfigXmlElement | None = None
+        element_stack: list[ConfigXmlElement] = []
+        for event, elem in ElementTree.iterparse(file, events=["start", "end"]):
+            elem = cast(ElementTree.Element, elem)
+            if event == "start":
+                # attributes are already available at the start of an element
+                if len(element_stack) > 0:
+                    parent = element_stack[-1]
+                    config_elem = ConfigXmlElement(elem, parent)
+                    parent.children.append(config_elem)
+                else:
+                    config_elem = ConfigXmlElement(elem)
+                    root = config_elem
+                element_stack.append(config_elem)
+            else:
+                element_stack.pop()
+                elem.clear()
+
+        return cast(ConfigXmlElement, root)
 
 
     def loc_str_keys(self) -> list[str]:
         if self.display_name == "" or self.non_localized:
             return []
         
-        match self.element.tag:
+        match self.tag:
             case "Group":
                 keys: list[str] = []
 
@@ -752,7 +869,7 @@ class ConfigXmlElement:
                 else:
                     keys.extend(panel_components)
                 
-                if "PresetsArray" in [child.element.tag for child in self.children]:
+                if any(child.tag == "PresetsArray" for child in self.children):
                     keys.append(f'preset_{self.display_name.replace(".", "_")}')
 
                 return keys
@@ -765,7 +882,7 @@ class ConfigXmlElement:
                     return [self.display_name]
             case "Option":
                 var_node = cast(ConfigXmlElement, self.parent.parent)
-                if var_node.non_localized or (var_node.non_localized_except_first and self.element.attrib["id"] != "0"):
+                if var_node.non_localized or (var_node.non_localized_except_first and self.option_id != "0"):
                     return []
                 elif not var_node.custom_names:
                     return [f'preset_value_{self.display_name}']
@@ -774,51 +891,57 @@ class ConfigXmlElement:
             case _:
                 return []
 
-    def child_loc_str_keys(self) -> list[str]:
-        if len(self.children) == 0:
-            return []
-        
-        keys: list[str] = []
-        for child in self.children:
-            keys.extend(child.loc_str_keys())
-            keys.extend(child.child_loc_str_keys())    
+    # Unique keys of this element and all of its descendants in document order, the dict serves as an ordered set
+    def all_loc_str_keys(self) -> dict[str, None]:
+        keys = dict[str, None]()
+        # depth-first with an explicit stack, children are pushed in reverse so they're visited in order
+        element_stack: list[ConfigXmlElement] = [self]
+        while len(element_stack) > 0:
+            element = element_stack.pop()
+            keys.update(dict.fromkeys(element.loc_str_keys()))
+            element_stack.extend(reversed(element.children))
 
         return keys
-    
-    def all_loc_str_keys(self) -> list[str]:
-        keys: list[str] = []
-        keys.extend(self.loc_str_keys())
-        keys.extend(self.child_loc_str_keys())
-        return keys
 
 
-def parse_config_xml_for_str_keys(xml_path: str, search: str) -> list[str]:
+def parse_config_xml_for_str_keys(xml_path: str, search: re.Pattern[str] | None) -> list[str]:
     encoding = guess_file_encoding(xml_path)
     log_info(f"Reading config XML {xml_path}. Detected encoding: {encoding}")
 
     keys: list[str] = []
     with io.open(xml_path, "r", encoding=encoding) as f:
-        xml_str = f.read()
-        root = ElementTree.fromstring(xml_str)
-        config_xml = ConfigXmlElement(root)
-
-        keys = remove_duplicate_keys_and_filter(config_xml.all_loc_str_keys(), search)
+        config_xml = ConfigXmlElement.from_file(f)
+        keys = filter_unique_keys(config_xml.all_loc_str_keys(), search)
 
     log_info(f"Found {len(keys)} string keys in {xml_path}")
     return keys
 
 
-def parse_bundled_xml_for_str_keys(xml_path: str, search: str) -> list[str]:
+def parse_bundled_xml_for_str_keys(xml_path: str, search: re.Pattern[str] | None) -> list[str]:
     encoding = guess_file_encoding(xml_path)
     log_info(f"Reading bundled XML {xml_path}. Detected encoding: {encoding}")
 
     keys: list[str] = []
     with io.open(xml_path, "r", encoding=encoding) as f:
-        for _, elem in ElementTree.iterparse(f, events=["start"]):
+        # elements are discarded as soon as they're closed, so memory usage doesn't grow with the size of the file
+        root: ElementTree.Element | None = None
+        depth = 0
+        for event, elem in ElementTree.iterparse(f, events=["start", "end"]):
             elem = cast(ElementTree.Element, elem)
-            if elem.tag in BUNDLED_XML_LOCALIZATION_ATTRIBS:
-                for attrib in BUNDLED_XML_LOCALIZATION_ATTRIBS[elem.tag]:
-                    keys.append(elem.attrib.get(attrib, ''))
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+
+                if elem.tag in BUNDLED_XML_LOCALIZATION_ATTRIBS:
+                    for attrib in BUNDLED_XML_LOCALIZATION_ATTRIBS[elem.tag]:
+                        keys.append(elem.attrib.get(attrib, ''))
+            else:
+                depth -= 1
+                elem.clear()
+                # drop already processed children of the root
+                if depth == 1 and root is not None:
+                    root.clear()
 
         keys = remove_duplicate_keys_and_filter(keys, search)
 
@@ -828,6 +951,16 @@ def parse_bundled_xml_for_str_keys(xml_path: str, search: str) -> list[str]:
 
 def is_config_xml(xml_path: str) -> bool:
     encoding = guess_file_encoding(xml_path)
+    with io.open(xml_path, "r", encoding=encoding, errors="ignore") as f:
+        head = XML_COMMENT_REGEX.sub('', f.read(XML_ROOT_SNIFF_SIZE))
+    
+    # the first tag that is not a prolog, doctype or comment is the root
+    # if a comment is not closed within the prefix the root may be beyond it, so let the parser handle it
+    if '<!--' not in head:
+        match = XML_TAG_REGEX.search(head)
+        if match is not None:
+            return match.group(1) == "UserConfig"
+
     with io.open(xml_path, "r", encoding=encoding) as f:
         _, root = next(ElementTree.iterparse(f, events=["start"]))
         root = cast(ElementTree.Element, root)
@@ -837,7 +970,7 @@ def is_config_xml(xml_path: str) -> bool:
     return False
 
 
-def parse_xml_for_str_keys(xml_path: str, search: str) -> tuple[list[str], bool]:
+def parse_xml_for_str_keys(xml_path: str, search: re.Pattern[str] | None) -> tuple[list[str], bool]:
     if is_config_xml(xml_path):
         return (parse_config_xml_for_str_keys(xml_path, search), True)
     else:
@@ -849,23 +982,37 @@ def parse_xml_for_str_keys(xml_path: str, search: str) -> tuple[list[str], bool]
 # WITCHERSCRIPT FILE PARSING
 ###############################################################################################################################
 
-def parse_ws_for_str_keys(ws_path: str, search: str) -> list[str]:
-    if search == "":
+def parse_ws_for_str_keys(ws_path: str, search: re.Pattern[str] | None) -> list[str]:
+    if search is None:
         raise Exception("Parsing WitcherScript requires to specify the --search parameter")
 
     encoding = guess_file_encoding(ws_path)
     log_info(f"Reading WitcherScript {ws_path}. Detected encoding: {encoding}")
 
-    possible_keys = list[str]()
-    with io.open(ws_path, mode='r', encoding=encoding) as f:
-        for line in f:
-            quoted = line.split('"')[1::2]
-            possible_keys.extend(quoted)
-
-    possible_keys = remove_duplicate_keys_and_filter(possible_keys, search)
+    keys: list[str]
+    if encoding in ("UTF-8", "UTF-8-SIG"):
+        # quotes and backslashes can't appear inside multi-byte UTF-8 sequences,
+        # so the file can be searched without decoding all of it first
+        raw_literals: list[bytes]
+        with io.open(ws_path, mode='rb') as f:
+            # mapping a small file costs more than just reading it, and empty files can't be mapped at all
+            if os.fstat(f.fileno()).st_size < WS_MMAP_MIN_FILE_SIZE:
+                raw_literals = WS_STRING_LITERAL_BYTES_REGEX.findall(f.read())
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    raw_literals = WS_STRING_LITERAL_BYTES_REGEX.findall(mm)
+
+        # the same literals tend to repeat a lot in scripts, so drop raw duplicates first
+        # and decode and match each distinct literal lazily while filtering;
+        # decoding is strict, so a file that isn't actually UTF-8 fails instead of producing mangled keys
+        literals = (literal.decode('UTF-8') for literal in dict.fromkeys(raw_literals))
+        keys = remove_duplicate_keys_and_filter(literals, search)
+    else:
+        with io.open(ws_path, mode='r', encoding=encoding) as f:
+            keys = remove_duplicate_keys_and_filter(WS_STRING_LITERAL_REGEX.findall(f.read()), search)
 
-    log_info(f"Found {len(possible_keys)} string keys in {ws_path}")
-    return possible_keys
+    log_info(f"Found {len(keys)} string keys in {ws_path}")
+    return keys
 
 
 
@@ -874,14 +1021,18 @@ def parse_ws_for_str_keys(ws_path: str, search: str) -> list[str]:
 ###############################################################################################################################
 
 class CLIArguments:
-    input_path: str
+    input_paths: list[str]
+    input_path: str  # the input currently being processed
     output_path: str
     lang: str  # one of ALL_LANGS or 'all'
     keep_csv: bool
     search: str
+    search_regex: re.Pattern[str] | None  # compiled search, None if no search was specified
 
 
-def make_cli() -> CLIArguments:
+# Cached, so that repeated programmatic calls to main don't build the parser again
+@functools.lru_cache(maxsize=1)
+def make_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description=f'w3stringsx v{W3STRINGSX_VERSION}\n'
                     'https://github.com/SpontanCombust/w3stringsx\n\n'
@@ -891,13 +1042,14 @@ def make_cli() -> CLIArguments:
         epilog='remarks:\n'
                 '  * in the case of CSV file context, the output path must be a directory\n'
                 '  * --language and --keep-csv arguments apply only to CSV file context\n'
-                '  * --search option applies only to XML and WitcherScript contexts'
+                '  * --search option applies only to XML and WitcherScript contexts\n'
+                '  * multiple inputs are processed one after another with the same options, the output path must then be a directory'
     )
 
     parser.add_argument(
         'input_path',
-        help='path to a file [.w3strings, .csv, .xml, .ws] or a directory with [.xml, .ws] files',
-        action='store'
+        help='path to a file [.w3strings, .csv, .xml, .ws] or a directory with [.xml, .ws] files; can be given multiple times',
+        nargs='+', action='store'
     )
 
     parser.add_argument(
@@ -928,11 +1080,16 @@ def make_cli() -> CLIArguments:
         help='logging level that should be used; available: [0 - no logs, 1 - only errors, 2 - errors and warnings, 3 - everything]; default: 3',
         default=3,
         dest='warn_level', action='store')
-    
-    args = parser.parse_args()
+
+    return parser
+
+
+def make_cli(argv: list[str] | None = None) -> CLIArguments:
+    args = make_arg_parser().parse_args(argv)
 
     cli = CLIArguments()
-    cli.input_path = str(args.input_path)
+    cli.input_paths = [str(input_path) for input_path in args.input_path]
+    cli.input_path = cli.input_paths[0]
     cli.output_path = str(args.output_path)
     cli.lang = str(args.lang)
     cli.keep_csv = bool(args.keep_csv)
@@ -947,55 +1104,106 @@ def make_cli() -> CLIArguments:
     return cli
 
 
+# Cached, so that repeated programmatic calls to main with the same search don't compile it again
+@functools.lru_cache(maxsize=64)
+def compile_search_regex(search: str) -> re.Pattern[str]:
+    return re.compile(search)
+
+
 def preprocess_cli_args(args: CLIArguments):
     if not os.path.exists(args.input_path):
         raise Exception(f'Path does not exist: "{args.input_path}"')
     
     args.input_path = os.path.realpath(args.input_path)
 
-    if args.lang not in ALL_LANGS and args.lang != 'all':
+    if args.lang not in ALL_LANGS_SET and args.lang != 'all':
         raise Exception(f'Invalid value for the --language option: {args.lang}')
     
-    if args.output_path != '':
-        if not os.path.exists(args.output_path):
-            if not maybeisfile(args.output_path):
-                log_warning('Specified output directory does not exist. Attempting to create one...')
-                try:
-                    os.mkdir(args.output_path)
-                except FileNotFoundError:
-                    raise Exception('Unable to create output directory. The parent of this directory does not exist.')
-                log_warning(f'Directory {args.output_path} created successfully')
-    else:
+    if args.output_path == '':
         args.output_path = os.path.dirname(args.input_path)
         log_info(f'Ouput path set to directory {args.output_path}')
 
     args.output_path = os.path.realpath(args.output_path)
 
-    try:
-        re.search(args.search, "test")
-    except Exception as e:
-        raise Exception(f'Invalid regex search string: {e}')
+    # compile once here instead of letting every filtered key go through re's internal cache
+    args.search_regex = None
+    if args.search != '':
+        try:
+            args.search_regex = compile_search_regex(args.search)
+        except re.error as e:
+            raise Exception(f'Invalid regex search string: {e}')
+
+
+# Kept apart from preprocess_cli_args, so nothing is created on disk until all inputs have been checked
+def create_output_dir(args: CLIArguments):
+    if not os.path.exists(args.output_path) and not maybeisfile(args.output_path):
+        log_warning('Specified output directory does not exist. Attempting to create one...')
+        try:
+            os.mkdir(args.output_path)
+        except FileNotFoundError:
+            raise Exception('Unable to create output directory. The parent of this directory does not exist.')
+        log_warning(f'Directory {args.output_path} created successfully')
 
 
 ###############################################################################################################################
 # MAIN
 ###############################################################################################################################
 
-def main():
-    args = make_cli()
-    preprocess_cli_args(args)
-
-    input_type = InputPathType.from_path(args.input_path)
-
+# argv defaults to sys.argv[1:], pass it explicitly to run the tool from another script
+def main(argv: list[str] | None = None):
+    args = make_cli(argv)
+
+    if len(args.input_paths) > 1 and not os.path.isdir(args.output_path) and maybeisfile(args.output_path):
+        raise Exception('Output path must be a directory when multiple inputs are given')
+
+    # every input is checked before any of them is processed, so a mistake in the arguments doesn't leave the work half done
+    inputs = list[tuple[CLIArguments, InputPathType]]()
+    csv_output_paths = set[str]()
+    decoded_output_paths = set[str]()
+    for input_path in args.input_paths:
+        input_args = copy.copy(args)
+        input_args.input_path = input_path
+        preprocess_cli_args(input_args)
+
+        input_type = InputPathType.from_path(input_args.input_path)
+        if input_type == InputPathType.UNSUPPORTED:
+            raise Exception(f'Unsupported file type: {os.path.basename(input_args.input_path)}')
+        elif input_type == InputPathType.CSV_FILE:
+            # encoded files are named only after the language, so they would overwrite each other
+            if input_args.output_path in csv_output_paths:
+                raise Exception(f'Multiple CSV files would be encoded into the same output directory: {input_args.output_path}')
+            csv_output_paths.add(input_args.output_path)
+        elif input_type == InputPathType.W3STRINGS_FILE:
+            # files from different mods tend to have the same name, e.g. en.w3strings, and the later one would replace the earlier
+            decoded_output_path = resolve_output_path(input_args.input_path, input_args.output_path, "{stem}.csv")
+            if decoded_output_path in decoded_output_paths:
+                raise Exception(f'Multiple w3strings files would be decoded into the same file: {decoded_output_path}')
+            decoded_output_paths.add(decoded_output_path)
+
+        inputs.append((input_args, input_type))
+
+    # only now that all inputs are known to be fine
+    for input_args, _ in inputs:
+        create_output_dir(input_args)
+
+    # looked up once and shared by all inputs that need it
+    encoder: W3StringsEncoder | None = None
+    for input_args, input_type in inputs:
+        if input_type in (InputPathType.W3STRINGS_FILE, InputPathType.CSV_FILE) and encoder is None:
+            encoder = W3StringsEncoder()
+
+        process_input(input_args, input_type, encoder)
+
+
+def process_input(args: CLIArguments, input_type: InputPathType, encoder: W3StringsEncoder | None):
     if input_type in (InputPathType.W3STRINGS_FILE, InputPathType.CSV_FILE):
-        encoder = W3StringsEncoder()
-        scratch = ScratchFolder(args.input_path)
-
-        match input_type:
-            case InputPathType.W3STRINGS_FILE:
-                w3strings_context_work(encoder, scratch, args)
-            case InputPathType.CSV_FILE:
-                csv_context_work(encoder, scratch, args)
+        encoder = cast(W3StringsEncoder, encoder)
+        with ScratchFolder(args.input_path) as scratch:
+            match input_type:
+                case InputPathType.W3STRINGS_FILE:
+                    w3strings_context_work(encoder, scratch, args)
+                case InputPathType.CSV_FILE:
+                    csv_context_work(encoder, scratch, args)
     else:
         match input_type:
             case InputPathType.XML_FILE:
@@ -1014,7 +1222,8 @@ def w3strings_context_work(encoder: W3StringsEncoder, scratch: ScratchFolder, ar
     lf_to_crlf(csv_file) # for whatever reason encoder saves the file with unix line endings
 
     output_path = resolve_output_path(scratch.input_copy_path, args.output_path, "{stem}.csv")
-    shutil.copy(csv_file, output_path)
+    # scratch files aren't needed anymore, so they're moved out instead of being copied
+    shutil.move(csv_file, output_path)
 
     log_info(f'{args.input_path} has been successfully decoded into {output_path}')
 
@@ -1034,19 +1243,19 @@ def csv_context_work(encoder: W3StringsEncoder, scratch: ScratchFolder, args: CL
         for lang in langs:
             copied = os.path.join(args.output_path, f'{lang}.w3strings')
             log_info(f'Creating {copied}')
-            shutil.copy(w3strings_file, copied)
+            link_or_copy(w3strings_file, copied)
   
     finally:
         if args.keep_csv:
             log_info(f'Saving prepared {os.path.basename(output_doc_path)} to {args.output_path}')
-            shutil.copy(output_doc_path, args.output_path)
+            shutil.move(output_doc_path, os.path.join(args.output_path, os.path.basename(output_doc_path)))
 
     log_info(f'{args.input_path} has been successfully encoded into w3strings file(s) in {args.output_path}')
 
 
 def xml_context_work(args: CLIArguments):
-    keys, is_config = parse_xml_for_str_keys(args.input_path, args.search)
-    entries = [CsvAbbreviatedEntry(key) for key in keys]
+    keys, is_config = parse_xml_for_str_keys(args.input_path, args.search_regex)
+    entries = (CsvAbbreviatedEntry(key) for key in keys)
     section_name = COMMENT_SECTION_MENU if is_config else COMMENT_SECTION_BUNDLE
     section = {section_name : entries}
 
@@ -1057,8 +1266,8 @@ def xml_context_work(args: CLIArguments):
 
 
 def witcherscript_context_work(args: CLIArguments):   
-    keys = sorted(parse_ws_for_str_keys(args.input_path, args.search))
-    entries = [CsvAbbreviatedEntry(key) for key in keys]
+    keys = sorted(parse_ws_for_str_keys(args.input_path, args.search_regex))
+    entries = (CsvAbbreviatedEntry(key) for key in keys)
     section = {COMMENT_SECTION_SCRIPTS : entries}
 
     csv_path = resolve_output_path(args.input_path, args.output_path, "{stem}.en.csv")
@@ -1067,39 +1276,60 @@ def witcherscript_context_work(args: CLIArguments):
     log_info(f'Localisation keys from {args.input_path} have been successfully saved to {csv_path}')
 
 
-def directory_context_work(args: CLIArguments):
-    menu_keys = list[str]()
-    bundle_keys = list[str]()
-    script_keys = list[str]()
-    for root, _, files in os.walk(args.input_path):
-        for file in files:
-            path = os.path.join(root, file)
-            match InputPathType.from_path(path):
-                case InputPathType.WITCHERSCRIPT_FILE:
-                    script_keys.extend(parse_ws_for_str_keys(path, args.search))
-                case InputPathType.XML_FILE:
-                    keys, for_menu = parse_xml_for_str_keys(path, args.search)
-                    if for_menu:
-                        menu_keys.extend(keys)
-                    else:
-                        bundle_keys.extend(keys)
-                case _:
-                    pass
+def init_worker_process(worker_logging_level: int):
+    # processes spawned on Windows don't inherit globals set by the CLI
+    global logging_level
+    logging_level = worker_logging_level
 
-    menu_keys = remove_duplicate_keys_and_filter(menu_keys, '')
 
-    bundle_keys = sorted(remove_duplicate_keys_and_filter(bundle_keys, ''))
-    # remove keys that appear across multiple source types
-    bundle_keys = key_list_difference(bundle_keys, menu_keys)
+# Returns the name of the CSV section the keys belong to and the keys themselves
+def scan_file_for_str_keys(path: str, search: re.Pattern[str] | None) -> tuple[str, list[str]]:
+    match InputPathType.from_file_extension(os.path.splitext(path)[1]):
+        case InputPathType.WITCHERSCRIPT_FILE:
+            return (COMMENT_SECTION_SCRIPTS, parse_ws_for_str_keys(path, search))
+        case InputPathType.XML_FILE:
+            keys, for_menu = parse_xml_for_str_keys(path, search)
+            return (COMMENT_SECTION_MENU if for_menu else COMMENT_SECTION_BUNDLE, keys)
+        case _:
+            raise Exception(f'Unsupported file type: {os.path.basename(path)}')
 
-    script_keys = sorted(remove_duplicate_keys_and_filter(script_keys, ''))
-    script_keys = key_list_difference(script_keys, menu_keys)
-    script_keys = key_list_difference(script_keys, bundle_keys)
+
+def directory_context_work(args: CLIArguments):
+    paths = list[str]()
+    for entry in walk_dir_files(args.input_path):
+        ext = os.path.splitext(entry.name)[1]
+        if InputPathType.from_file_extension(ext) in (InputPathType.WITCHERSCRIPT_FILE, InputPathType.XML_FILE):
+            paths.append(entry.path)
+
+    # files are independent of each other, so for bigger mods they get scanned in parallel
+    # results are still collected in the order of paths, so that menu keys keep a stable order
+    results: list[tuple[str, list[str]]]
+    if len(paths) >= PARALLEL_SCAN_MIN_FILES:
+        workers = min(os.cpu_count() or 1, len(paths), 61) # 61 is the limit on Windows
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_process, initargs=(logging_level,)) as executor:
+            chunksize = max(1, len(paths) // (workers * 4))
+            results = list(executor.map(scan_file_for_str_keys, paths, itertools.repeat(args.search_regex), chunksize=chunksize))
+    else:
+        results = [scan_file_for_str_keys(path, args.search_regex) for path in paths]
+
+    # keys that appear across multiple source types are assigned only to the most important one: menu > bundle > scripts
+    # results are visited in that order, so the first section a key is found in is the one it belongs to
+    # menu keys additionally keep the order in which they were found
+    section_order = [COMMENT_SECTION_MENU, COMMENT_SECTION_BUNDLE, COMMENT_SECTION_SCRIPTS]
+    results.sort(key=lambda result: section_order.index(result[0])) # stable, keeps the order of files
+    key_sections = dict[str, str]()
+    for section, keys in results:
+        for key in keys:
+            key_sections.setdefault(key, section)
+
+    section_keys: dict[str, list[str]] = {section: [] for section in section_order}
+    for key, section in key_sections.items():
+        section_keys[section].append(key)
 
     sections = {
-        COMMENT_SECTION_MENU: [CsvAbbreviatedEntry(key) for key in menu_keys],
-        COMMENT_SECTION_BUNDLE: [CsvAbbreviatedEntry(key) for key in bundle_keys],
-        COMMENT_SECTION_SCRIPTS: [CsvAbbreviatedEntry(key) for key in script_keys]
+        COMMENT_SECTION_MENU: (CsvAbbreviatedEntry(key) for key in section_keys[COMMENT_SECTION_MENU]),
+        COMMENT_SECTION_BUNDLE: (CsvAbbreviatedEntry(key) for key in sorted(section_keys[COMMENT_SECTION_BUNDLE])),
+        COMMENT_SECTION_SCRIPTS: (CsvAbbreviatedEntry(key) for key in sorted(section_keys[COMMENT_SECTION_SCRIPTS]))
     }
 
     csv_path = resolve_output_path(args.input_path, args.output_path, "{stem}.en.csv")
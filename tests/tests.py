@@ -1,156 +1,193 @@
-import hashlib
+import contextlib
+import filecmp
 import io
 import os
 import shutil
 import subprocess
+import sys
+import tempfile
 import unittest
+from unittest import mock
+from typing import NamedTuple
+
+ROOT_DIR = os.path.abspath(os.path.join(__file__, '../../'))
+SCRIPT_PATH = f'{ROOT_DIR}/src/w3stringsx.py'
+
+sys.path.insert(0, f'{ROOT_DIR}/src')
+import w3stringsx
+
+# Set this environment variable to run the tool in a separate process for every case, like it's run from the command line
+RUN_IN_SUBPROCESS = os.environ.get('W3STRINGSX_TESTS_SUBPROCESS', '') not in ('', '0')
+
+
+# Arguments for Tests.run_case, a test method named test_<name> is generated for every case
+class Case(NamedTuple):
+    name: str
+    extra_args: tuple[str, ...] = () # already split the way a shell would, so they're passed on as they are
+    output_path: str | None = None # output file name, if the output path should point to a file
+    see_output: bool = False
+
+
+CASES: list[Case] = [
+    Case('decode_en'),
+    Case('decode_pl'),
+    Case('encode_en'),
+    Case('encode_pl'),
+    Case('encode_only_pl', ('-l', 'pl')),
+    Case('encode_pl_no_header', ('-l', 'pl')),
+    Case('encode_pl_from_header', ('-l', 'pl')),
+    Case('encode_default_lang'),
+    Case('encode_abbreviated', ('-l', 'esmx')),
+    Case('encode_abbreviated_no_header', ('-l', 'pl', '-k')),
+    Case('encode_keep_csv', ('-l', 'esmx', '-k')),
+    Case('encode_vanilla', ('-l', 'en')),
+    Case('encode_mixed', ('-l', 'en', '-k')),
+    Case('encode_mixed_overlap', ('-l', 'en', '-k')),
+    Case('parse_xml'),
+    Case('parse_xml_custom_names'),
+    Case('decode_with_file_output', output_path='decoded.csv'),
+    Case('parse_xml_with_file_output', output_path='parsed.csv'),
+    Case('decode path with spaces'),
+    Case('encode path with spaces', ('-l', 'en')),
+    Case('parse_ws', ('-s', '^ibt_')),
+    Case('parse_xml_search', ('--search', 'MOD')),
+    Case('parse_xml_non_localized'),
+    Case('parse_xml_bundled_items'),
+    Case('parse_dir', ('-s', '(Mods|ibt_)')),
+    Case('parse_dir_merge', ('-s', '(Mods|ibt_)')),
+    Case('parse_dir_merge_no_sections', ('-s', '(Mods|ibt_)')),
+    Case('parse_multiple_inputs', ('-s', '(Mods|ibt_)')),
+]
 
-def file_hash(file_path: str) -> str:
-    with io.open(file_path, 'rb') as f:
-        data = f.read()
-        md5 = hashlib.md5(data)
-        return md5.hexdigest()
-    
 
 class Tests(unittest.TestCase):
-    def test_decode_en(self):
-        self.run_case('decode_en')
-
-    def test_decode_pl(self):
-        self.run_case('decode_pl')
-
-    def test_encode_en(self):
-        self.run_case('encode_en')
-
-    def test_encode_pl(self):
-        self.run_case('encode_pl')
-
-    def test_encode_only_pl(self):
-        self.run_case('encode_only_pl', "-l pl")
-
-    def test_encode_pl_no_header(self):
-        self.run_case('encode_pl_no_header', "-l pl")
-
-    def test_encode_pl_from_header(self):
-        self.run_case('encode_pl_from_header', "-l pl")
-
-    def test_encode_default_lang(self):
-        self.run_case('encode_default_lang')
-
-    def test_encode_abbreviated(self):
-        self.run_case('encode_abbreviated', '-l esmx')
-
-    def test_encode_abbreviated_no_header(self):
-        self.run_case('encode_abbreviated_no_header', '-l pl -k')
-
-    def test_encode_keep_csv(self):
-        self.run_case('encode_keep_csv', '-l esmx -k')
-
-    def test_encode_vanilla(self):
-        self.run_case('encode_vanilla', '-l en')
-
-    def test_encode_mixed(self):
-        self.run_case('encode_mixed', '-l en -k')
-
-    def test_encode_mixed_overlap(self):
-        self.run_case('encode_mixed_overlap', '-l en -k')
-
-    def test_parse_xml(self):
-        self.run_case('parse_xml')
-
-    def test_parse_xml_custom_names(self):
-        self.run_case('parse_xml_custom_names')
-
-    def test_decode_with_file_output(self):
-        self.run_case('decode_with_file_output', output_path='decoded.csv')
-
-    def test_parse_xml_with_file_output(self):
-        self.run_case('parse_xml_with_file_output', output_path='parsed.csv')
-
-    def test_decode_path_with_spaces(self):
-        self.run_case('decode path with spaces')
-
-    def test_encode_path_with_spaces(self):
-        self.run_case('encode path with spaces', '-l en')
-
-    def test_parse_ws(self):
-        self.run_case('parse_ws', '-s "^ibt_"')
-
-    def test_parse_xml_search(self):
-        self.run_case('parse_xml_search', '--search "MOD"')
-
-    def test_parse_xml_non_localized(self):
-        self.run_case('parse_xml_non_localized')
-
-    def test_parse_xml_bundled_items(self):
-        self.run_case('parse_xml_bundled_items')
-
-    def test_parse_dir(self):
-        self.run_case('parse_dir', '-s "(Mods|ibt_)"')
-
-    def test_parse_dir_merge(self):
-        self.run_case('parse_dir_merge', '-s "(Mods|ibt_)"')
-
-    def test_parse_dir_merge_no_sections(self):
-        self.run_case('parse_dir_merge_no_sections', '-s "(Mods|ibt_)"')
-
-
-    def run_case(self, case_name: str, extra_args: str = '', output_path: str | None = None, see_output: bool = False):
-        root_dir = os.path.abspath(os.path.join(__file__, '../../'))
-        case_dir = f"{root_dir}/tests/{case_name}"
+    # parse_dir has too few files to be scanned by worker processes, so the threshold is lowered to check that path gives the same output
+    def test_parse_dir_parallel(self):
+        if RUN_IN_SUBPROCESS:
+            self.skipTest('the scan threshold can only be lowered when running in-process')
+
+        with mock.patch.object(w3stringsx, 'PARALLEL_SCAN_MIN_FILES', 2), \
+             mock.patch.object(w3stringsx, 'ProcessPoolExecutor', wraps=w3stringsx.ProcessPoolExecutor) as executor:
+            self.run_case('parse_dir', ('-s', '(Mods|ibt_)'))
+            executor.assert_called_once()
+
+    def test_encode_multiple_csv_same_output(self):
+        with tempfile.TemporaryDirectory(prefix='w3stringsx_tests_') as temp_dir:
+            output_dir = f"{temp_dir}/output"
+            argv = [f"{ROOT_DIR}/tests/encode_en/input/en.csv", f"{ROOT_DIR}/tests/encode_pl/input/pl.csv", '-o', output_dir]
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                with self.assertRaisesRegex(Exception, 'Multiple CSV files would be encoded into the same output directory'):
+                    w3stringsx.main(argv)
+
+            # the run is rejected before anything is created
+            self.assertFalse(os.path.exists(output_dir))
+
+    def test_decode_multiple_w3strings_same_output(self):
+        with tempfile.TemporaryDirectory(prefix='w3stringsx_tests_') as temp_dir:
+            # same file name in different directories, as with files from different mods
+            input_paths = list[str]()
+            for mod_name in ('modA', 'modB'):
+                os.mkdir(f"{temp_dir}/{mod_name}")
+                input_path = f"{temp_dir}/{mod_name}/en.w3strings"
+                shutil.copy(f"{ROOT_DIR}/tests/decode_en/input/en.w3strings", input_path)
+                input_paths.append(input_path)
+
+            output_dir = f"{temp_dir}/output"
+            argv = [*input_paths, '-o', output_dir]
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                with self.assertRaisesRegex(Exception, 'Multiple w3strings files would be decoded into the same file'):
+                    w3stringsx.main(argv)
+
+            # the run is rejected before anything is created
+            self.assertFalse(os.path.exists(output_dir))
+
+    def run_case(self, case_name: str, extra_args: tuple[str, ...] = (), output_path: str | None = None, see_output: bool = False):
+        case_dir = f"{ROOT_DIR}/tests/{case_name}"
 
         input_dir = f"{case_dir}/input"
-        output_dir = f"{case_dir}/output"
         output_preload_dir = f"{case_dir}/output_preload"
         expected_dir = f"{case_dir}/expected"
 
-        input_path = f"{input_dir}/{os.listdir(input_dir)[0]}"
+        # output is only kept in the repository when it's meant to be looked at,
+        # otherwise it goes to the system's temporary directory, which is often kept in memory
+        output_dir: str
+        if see_output:
+            output_dir = f"{case_dir}/output"
+            os.makedirs(output_dir, exist_ok=True)
+        else:
+            output_dir = tempfile.mkdtemp(prefix=f"w3stringsx_tests_{case_name.replace(' ', '_')}_")
+
+        # everything in the input directory is passed to the tool, in name order
+        input_paths = [f"{input_dir}/{input}" for input in sorted(os.listdir(input_dir))]
         output_path = f"{output_dir}/{output_path}" if output_path is not None else output_dir
 
-        if not os.path.exists(output_dir):
-            os.mkdir(output_dir)
         if os.path.exists(output_preload_dir):
             output_preload_path = f"{output_preload_dir}/{os.listdir(output_preload_dir)[0]}"
             shutil.copy(output_preload_path, output_dir)
         
-        cmd = f'python {root_dir}/src/w3stringsx.py "{input_path}" -o "{output_path}" {extra_args}'
-        try:
-            subprocess.run(cmd, shell=True, check=True, stdout=(None if see_output else subprocess.DEVNULL))
-        except:
-            pass
+        argv = [*input_paths, '-o', output_path, *extra_args]
+        # what the tool prints is kept and shown only if the case fails, unless see_output is set
+        tool_output = ''
+        if RUN_IN_SUBPROCESS:
+            # no shell in between, so paths don't need quoting
+            cmd = [sys.executable, SCRIPT_PATH, *argv]
+            if see_output:
+                subprocess.run(cmd)
+            else:
+                result = subprocess.run(cmd, capture_output=True, text=True, errors='replace')
+                tool_output = result.stdout + result.stderr
+        else:
+            # running main directly spares starting a new interpreter for every case
+            buffer = io.StringIO()
+            with contextlib.ExitStack() as stack:
+                if not see_output:
+                    stack.enter_context(contextlib.redirect_stdout(buffer))
+                    stack.enter_context(contextlib.redirect_stderr(buffer))
+
+                # same as when the tool runs on its own, errors are reported and the output is compared anyway
+                try:
+                    w3stringsx.main(argv)
+                except Exception as e:
+                    w3stringsx.log_error(f'{e}')
+                except SystemExit:
+                    pass
+            tool_output = buffer.getvalue()
 
         try:
             self.assert_output(expected_dir, output_dir)
+        except AssertionError as e:
+            if tool_output == '':
+                raise
+            raise self.failureException(f'{e}\n\nw3stringsx output:\n{tool_output}') from None
         finally:
             if not see_output:
-                for output in os.listdir(output_dir):
-                    output_path = os.path.join(output_dir, output)
-                    os.remove(output_path)
-
-
-    def assert_same_files(self, f1: str, f2: str):
-        self.assertTrue(os.path.exists(f1))
-        self.assertTrue(os.path.exists(f2))
+                shutil.rmtree(output_dir, ignore_errors=True)
 
-        f1_hash = file_hash(f1)
-        f2_hash = file_hash(f2)
-        self.assertEqual(f1_hash, f2_hash)
 
     def assert_output(self, expected_dir: str, output_dir: str):
         self.assertTrue(os.path.exists(output_dir))
 
-        expected_files = os.listdir(expected_dir)
-        expected_files.sort()
-
-        output_files = os.listdir(output_dir)
-        output_files.sort()
+        expected_files = sorted(os.listdir(expected_dir))
+        output_files = sorted(os.listdir(output_dir))
 
         self.assertEqual(expected_files, output_files)
 
-        for i in range(len(expected_files)):
-            e = os.path.join(expected_dir, expected_files[i])
-            o = os.path.join(output_dir, output_files[i]) 
-            self.assert_same_files(e, o)
+        # filecmp tells files of different size apart without reading them and stops reading at the first difference
+        _, mismatch, errors = filecmp.cmpfiles(expected_dir, output_dir, expected_files, shallow=False)
+        self.assertEqual(mismatch, [], 'Output files differ from the expected ones')
+        self.assertEqual(errors, [], 'Output files could not be compared')
+
+
+# case is bound as an argument, a closure created directly in the loop would see only the last row
+def make_case_test(case: Case):
+    def test(self: Tests):
+        self.run_case(case.name, case.extra_args, case.output_path, case.see_output)
+    return test
+
+for case in CASES:
+    setattr(Tests, f"test_{case.name.replace(' ', '_')}", make_case_test(case))
    
 
 if __name__ == '__main__':